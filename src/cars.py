@@ -37,9 +37,39 @@ class CarsParser(ptag.RecBuilder):
         """Parse any iterable, without the app needing to create a parser object"""
         CarsParser().parse_from(iterable)
 
+#-------------------------------------------------------------------------------
+class CarsDiffer(ptag.RecDiffer, CarsParser):
+    """Only report car parks that changed since the last poll"""
+    KEY = "code"
+
+    @staticmethod
+    def do_parse_file(filename:str, cache_filename:str or None=None) -> None:
+        """Parse a file, without the app needing to create a parser object"""
+        CarsDiffer(cache_filename).parse_file(filename)
+
+    @staticmethod
+    def do_parse_from(iterable, cache_filename:str or None=None) -> None:
+        """Parse any iterable, without the app needing to create a parser object"""
+        CarsDiffer(cache_filename).parse_from(iterable)
+
 if __name__ == "__main__":
     # wget -O cars.xml http://data.nottinghamtravelwise.org.uk/parking.xml
     FILENAME = "cars.xml"
     CarsParser.do_parse_file(FILENAME)
 
+    # poll the same snapshot twice, second time round nothing has changed
+    differ = CarsDiffer()
+    differ.parse_file(FILENAME)
+    differ.parse_file(FILENAME)
+    print("# changes:", differ.get_counts())
+
+    # next poll, car park 210 has filled up a bit and 211 has gone away
+    with open(FILENAME) as f:
+        snapshot = f.read()
+    snapshot = snapshot.replace("<Occupancy>356</Occupancy>", "<Occupancy>360</Occupancy>")
+    start = snapshot.index("<Carpark>\n    <SystemCodeNumber>211<")
+    end = snapshot.index("</Carpark>", start) + len("</Carpark>")
+    differ.parse_from((snapshot[:start] + snapshot[end:],))
+    print("# changes:", differ.get_counts())
+
 # END
\ No newline at end of file
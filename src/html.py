@@ -1,18 +1,19 @@
 #! /usr/bin/env python3
 # html.py  25/06/2025  D.J.Whale
 
+import io
 import ptag
 
 #----- HTML TEST PARSER --------------------------------------------------------
 class HTMLTestParser(ptag.RuleParser):
     """A demonstration of extracting data from a specific HTML file format"""
     RULES = {
-        "/html/head/title/":    lambda v: print("title:%s" % v),
-        "/html/body/h1/":       lambda v: print("heading:%s" % v),
-        "/html/body/a/href":    lambda v: print("href:%s" % v)
+        "/html/head/title/":    (ptag.RuleParser.emit_format, "title:%s"),
+        "/html/body/h1/":       (ptag.RuleParser.emit_format, "heading:%s"),
+        "/html/body/a/href":    (ptag.RuleParser.emit_format, "href:%s")
     }
-    def __init__(self):
-        ptag.RuleParser.__init__(self)
+    def __init__(self, **kwargs):
+        ptag.RuleParser.__init__(self, **kwargs)
 
     @staticmethod
     def do_parse_file(filename:str) -> None:
@@ -28,7 +29,7 @@ class HTMLTestParser(ptag.RuleParser):
 class HTMLTableParser(ptag.RuleParser):
     def SetTableName(self, rules, value):
         _ = rules  # argused
-        print("# table:", value)
+        self._sink.print("# table:", value)
         self._table_name = value
 
     def AddHeading(self, rules, value):
@@ -37,7 +38,7 @@ class HTMLTableParser(ptag.RuleParser):
 
     def EndHeadings(self, rules, value):
         _,_ = rules, value  # argsused
-        print("# headings:", self._headings)
+        self._sink.print("# headings:", self._headings)
 
     def StartRow(self, rules, value):
         _,_ = rules, value  # argsused
@@ -49,7 +50,7 @@ class HTMLTableParser(ptag.RuleParser):
 
     def EndRow(self, rules, value):
         _,_ = rules, value  #argsused
-        print(self._row)
+        self._sink.print(self._row)
 
     RULES = {
         "/html/body/h1/":                   (SetTableName,),
@@ -66,6 +67,12 @@ class HTMLTableParser(ptag.RuleParser):
         self._headings = []
         self._rows = {}
 
+    def reset(self) -> None:
+        ptag.RuleParser.reset(self)
+        self._table_name = None
+        self._headings = []
+        self._rows = {}
+
     @staticmethod
     def do_parse_file(filename:str) -> None:
         """Parse a file, without the app needing to create a parser object"""
@@ -85,3 +92,39 @@ if __name__ == "__main__":
 
     FILENAME = "test_table.html"
     HTMLTableParser.do_parse_file(FILENAME)
+
+    # one parse of the file, shared by several parsers
+    FILENAME = "test.html"
+    ptag.MultiParser(ptag.PathClassifier(), ptag.HTMLHREFExtractor(), HTMLTestParser()).parse_file(FILENAME)
+
+    # a consumer with a sink of its own, flushed when the shared parse finishes
+    captured = io.StringIO()
+    ptag.MultiParser(HTMLTestParser(), HTMLTestParser(sink=ptag.OutputSink(captured))).parse_file(FILENAME)
+    print("# captured:", repr(captured.getvalue()))
+
+    # one parser object reused for every document, so its state must not leak
+    table = HTMLTableParser()
+    table.parse_file("test_table.html")
+    table.parse_file("test_table.html")
+
+    # a stream of concatenated documents, then the same as length-delimited frames
+    with open("test.html") as f:
+        lines = f.readlines()
+    parser = HTMLTestParser()
+    parser.parse_stream(lines + ["\n"] + lines)
+    document = "".join(lines).encode("utf-8")
+    frame = b"%d\n" % len(document) + document
+    parser.parse_frames(io.BytesIO(frame + frame))
+    # documents can also end part way through an item
+    parser.parse_stream(["<html><body><h1>one</h1></body></html><html><body>",
+                         "<h1>two</h1></body></html>  <html><body><h1>three</h1></body></html>\n"])
+
+    # a document that goes over its budget is stopped, and says why
+    parser = HTMLTestParser(limits=ptag.Limits(max_attributes=0))
+    try:
+        parser.parse_file("test.html")
+    except ptag.LimitExceeded as e:
+        print("#", e)
+        print("# elements:", e.counters["elements"], "depth:", e.counters["depth"])
+    # and the same parser carries on with the next document
+    parser.parse_from(["<html><body><h1>still works</h1></body></html>"])
@@ -9,36 +9,36 @@ class NewsParser(ptag.RuleParser):
     RULES = {
         #----- CHANNEL
         ##"/rss/channel":
-        "/rss/channel/title/":                      lambda v:print("title:", v),
-        "/rss/channel/link/":                       lambda v:print("link:", v),
-        "/rss/channel/description/":                lambda v:print("description:", v),
-        "/rss/channel/language/":                   lambda v:print("language:", v),
-        "/rss/channel/lastBuildDate/":              lambda v:print("lastBuildDate:", v),
-        "/rss/channel/copyright/":                  lambda v:print("copyright:", v),
-        "/rss/channel/image/url/":                  lambda v:print("url:", v),
-        "/rss/channel/image/title/":                lambda v:print("title:", v),
-        "/rss/channel/image/link/":                 lambda v:print("link:", v),
-        "/rss/channel/image/width/":                lambda v:print("width:",v),
-        "/rss/channel/image/height/":               lambda v:print("height:", v),
-        "/rss/channel/ttl/":                        lambda v:print("ttl:", v),
+        "/rss/channel/title/":                      (ptag.RuleParser.emit, "title:"),
+        "/rss/channel/link/":                       (ptag.RuleParser.emit, "link:"),
+        "/rss/channel/description/":                (ptag.RuleParser.emit, "description:"),
+        "/rss/channel/language/":                   (ptag.RuleParser.emit, "language:"),
+        "/rss/channel/lastBuildDate/":              (ptag.RuleParser.emit, "lastBuildDate:"),
+        "/rss/channel/copyright/":                  (ptag.RuleParser.emit, "copyright:"),
+        "/rss/channel/image/url/":                  (ptag.RuleParser.emit, "url:"),
+        "/rss/channel/image/title/":                (ptag.RuleParser.emit, "title:"),
+        "/rss/channel/image/link/":                 (ptag.RuleParser.emit, "link:"),
+        "/rss/channel/image/width/":                (ptag.RuleParser.emit, "width:"),
+        "/rss/channel/image/height/":               (ptag.RuleParser.emit, "height:"),
+        "/rss/channel/ttl/":                        (ptag.RuleParser.emit, "ttl:"),
         #----- ATOM
         ##"/rss/channel/atom:link":
-        "/rss/channel/atom:link/href":              lambda v:print("atom href:", v),
-        "/rss/channel/atom:link/rel":               lambda v:print("atom rel:", v),
-        "/rss/channel/atom:link/type":              lambda v:print("atom type:", v),
+        "/rss/channel/atom:link/href":              (ptag.RuleParser.emit, "atom href:"),
+        "/rss/channel/atom:link/rel":               (ptag.RuleParser.emit, "atom rel:"),
+        "/rss/channel/atom:link/type":              (ptag.RuleParser.emit, "atom type:"),
         ##"/rss/channel/atom:link~":
         #---- ITEM
         ##"/rss/channel/item":
-        "/rss/channel/item/title/":                 lambda v:print("item title:", v),
-        "/rss/channel/item/description/":           lambda v:print("item desc:", v),
-        "/rss/channel/item/link/":                  lambda v:print("item link:", v),
-        "/rss/channel/item/guid/isPermaLink":       lambda v:print("item guid perma:", v),
-        "/rss/channel/item/guid/":                  lambda v:print("item guid:", v),
-        "/rss/channel/item/pubDate/":               lambda v:print("item pubdate:", v),
-        "/rss/channel/item/media:thumbnail/width":  lambda v:print("item tnwidth:", v),
-        "/rss/channel/item/media:thumbnail/height": lambda v:print("item thheight:", v),
-        "/rss/channel/item/media:thumbnail/url":    lambda v:print("item tnurl:", v),
-        "/rss/channel/item~":                       lambda v:print(),
+        "/rss/channel/item/title/":                 (ptag.RuleParser.emit, "item title:"),
+        "/rss/channel/item/description/":           (ptag.RuleParser.emit, "item desc:"),
+        "/rss/channel/item/link/":                  (ptag.RuleParser.emit, "item link:"),
+        "/rss/channel/item/guid/isPermaLink":       (ptag.RuleParser.emit, "item guid perma:"),
+        "/rss/channel/item/guid/":                  (ptag.RuleParser.emit, "item guid:"),
+        "/rss/channel/item/pubDate/":               (ptag.RuleParser.emit, "item pubdate:"),
+        "/rss/channel/item/media:thumbnail/width":  (ptag.RuleParser.emit, "item tnwidth:"),
+        "/rss/channel/item/media:thumbnail/height": (ptag.RuleParser.emit, "item thheight:"),
+        "/rss/channel/item/media:thumbnail/url":    (ptag.RuleParser.emit, "item tnurl:"),
+        "/rss/channel/item~":                       (ptag.RuleParser.emit,),
         ##"/rss/channel~":
         }
 
@@ -4,17 +4,193 @@
 #   based on php code 2012 D.J.Whale
 
 import xml.sax
+import io
+import codecs
+import hashlib
+import json
+import os
+import sys
+import atexit
+import time
+
+#-------------------------------------------------------------------------------
+class OutputSink:
+    """Buffered output for emitters, much cheaper than a print() per event"""
+    # Text and bytes are collected into one large buffer and written out in
+    # big blocks. finish() on a parser flushes its sink, so output is never
+    # held back past the end of a document. Call flush() before any print()
+    # of your own if ordering with sink output matters.
+    BUFFER_SIZE = 1024*1024
+
+    def __init__(self, stream=None, *, jsonl:bool=False, buffer_size:int=BUFFER_SIZE, encoding:str="utf-8"):
+        self._stream = stream  # None means whatever sys.stdout is at flush time
+        self.jsonl = jsonl     # print() writes one JSON value per line
+        self._buffer_size = buffer_size
+        self._encoding = encoding
+        self._buffer = bytearray()
+
+    def write(self, text:str) -> None:
+        self._buffer += text.encode(self._encoding)
+        if len(self._buffer) >= self._buffer_size: self.flush()
+
+    def write_bytes(self, data:bytes) -> None:
+        self._buffer += data
+        if len(self._buffer) >= self._buffer_size: self.flush()
+
+    def write_json(self, value) -> None:
+        """Write any JSON serialisable value, as a single JSON Lines record"""
+        self.write(json.dumps(value, separators=(",", ":")) + "\n")
+
+    def print(self, *values, sep:str=" ", end:str="\n") -> None:
+        """Drop in replacement for print()"""
+        if self.jsonl:
+            self.write_json(values[0] if len(values) == 1 else list(values))
+        else:
+            self.write(sep.join([str(v) for v in values]) + end)
+
+    def flush(self) -> None:
+        stream = self._stream if self._stream is not None else sys.stdout
+        if len(self._buffer) != 0:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)):
+                stream.write(data)  # binary stream, e.g. a socket or a file opened "wb"
+            elif self._same_bytes(stream):
+                stream.flush()  # keep order with anything already print()ed
+                stream.buffer.write(data)
+            else:
+                # let the text stream do its own encoding and newlines, e.g. StringIO
+                stream.write(data.decode(self._encoding))
+        stream.flush()
+
+    def _same_bytes(self, stream) -> bool:
+        # a text stream can take our bytes as they are, only if it would encode
+        # them the same way and not translate "\n", as sys.stdout usually does.
+        # A stream opened with an explicit newline= can't be told apart, so
+        # give that a sink of its own, or wrap its binary buffer instead
+        binary = getattr(stream, "buffer", None)
+        encoding = getattr(stream, "encoding", None)
+        if binary is None or encoding is None or os.linesep != "\n": return False
+        try:
+            return codecs.lookup(encoding).name == codecs.lookup(self._encoding).name
+        except LookupError:
+            return False
+
+    def redirect(self, stream) -> None:
+        """Send all future output to a different stream, None for sys.stdout"""
+        try:
+            self.flush()
+        except (OSError, ValueError):
+            pass # the old stream has gone (e.g. a client hung up), and so has its output
+        finally:
+            self._buffer.clear()
+            self._stream = stream
+
+# default sink for all the built in emitters
+output = OutputSink()
+atexit.register(output.flush)
+
+#-------------------------------------------------------------------------------
+class Limits:
+    """Resource budgets for parsing one document, None means unlimited"""
+    # max_depth:      deepest element nesting
+    # max_text:       characters in any one text node (or attribute value)
+    # max_attributes: attributes on any one element
+    # max_expansion:  text out per character in, catches entity expansion
+    # max_input:      characters (or bytes) fed in
+    # max_seconds:    wall clock time from start()
+    def __init__(self, *, max_depth:int or None=None, max_text:int or None=None,
+                 max_attributes:int or None=None, max_expansion:float or None=None,
+                 max_input:int or None=None, max_seconds:float or None=None):
+        self.max_depth      = max_depth
+        self.max_text       = max_text
+        self.max_attributes = max_attributes
+        self.max_expansion  = max_expansion
+        self.max_input      = max_input
+        self.max_seconds    = max_seconds
+
+class LimitExceeded(Exception):
+    """A document went over one of its Limits"""
+    def __init__(self, limit:str, value, maximum, counters:dict):
+        Exception.__init__(self, "limit exceeded: %s %s > %s" % (limit, str(value), str(maximum)))
+        self.limit    = limit     # name of the Limits field, e.g. "max_depth"
+        self.value    = value
+        self.maximum  = maximum
+        self.counters = counters  # get_counters() at the time
 
 #-------------------------------------------------------------------------------
 class TagParser:
     """Parse a file into a set of tag start/end handler calls"""
+    class RootClosed(Exception):
+        """The root element closed, raised to split a stream between documents"""
+        pass
+
     class InboundContentHandler(xml.sax.ContentHandler):
-        def __init__(self, outbound_handler):
+        # allow some text before max_expansion applies, for short documents
+        EXPANSION_SLACK = 4096
+        # only look at the clock every so many elements
+        CLOCK_ELEMENTS = 256
+
+        def __init__(self, outbound_handler, limits=None):
             xml.sax.ContentHandler.__init__(self)
             self._outbound_handler = outbound_handler
+            if limits is None: limits = Limits()
+            # unlimited is just a very big number, so checks never need to test for None
+            self._max_depth      = limits.max_depth      if limits.max_depth      is not None else sys.maxsize
+            self._max_text       = limits.max_text       if limits.max_text       is not None else sys.maxsize
+            self._max_attributes = limits.max_attributes if limits.max_attributes is not None else sys.maxsize
+            self._max_expansion  = limits.max_expansion  if limits.max_expansion  is not None else float("inf")
+            self._max_input      = limits.max_input      if limits.max_input      is not None else sys.maxsize
+            self._max_seconds    = limits.max_seconds
+            self._stop_at_end    = False  # raise RootClosed when the root element closes
+            # attribute values only need scanning if a text limit could catch them
+            self._scan_attributes = limits.max_text is not None or limits.max_expansion is not None
+            self.reset()
+            # prefer the bulk attribute event, if the outbound handler has one
+            self._bulk_attributes = hasattr(outbound_handler, "doAttributes")
+
+        def reset(self) -> None:
             self._databuffer = None
             self._current_tag = ""
             self._depth = 0
+            self._ended = False  # root element of the document has closed
+            # per document counters
+            self._textlen = 0     # of the text node being collected
+            self._elements = 0
+            self._attributes = 0
+            self._deepest = 0
+            self._longest_text = 0
+            self._text = 0
+            self._input = 0
+            self._started_at = time.monotonic()
+            self._deadline = float("inf") if self._max_seconds is None else self._started_at + self._max_seconds
+
+        def get_counters(self) -> dict:
+            return {
+                "elements":     self._elements,
+                "attributes":   self._attributes,
+                "depth":        self._deepest,
+                "longest_text": max(self._longest_text, self._textlen),
+                "text":         self._text,  # attribute values only if a text limit is set
+                "input":        self._input,
+                "seconds":      time.monotonic() - self._started_at,
+            }
+
+        def _exceeded(self, limit:str, value, maximum) -> None:
+            raise LimitExceeded(limit, value, maximum, self.get_counters())
+
+        def count_input(self, size:int) -> None:
+            self._input += size
+            if self._input > self._max_input:
+                self._exceeded("max_input", self._input, self._max_input)
+            if time.monotonic() > self._deadline:
+                self._exceeded("max_seconds", time.monotonic() - self._started_at, self._max_seconds)
+
+        def is_ended(self) -> bool:
+            return self._ended
+
+        def set_stop_at_end(self, stop:bool) -> None:
+            self._stop_at_end = stop
 
         def flushdata(self):
             if self._databuffer != None:
@@ -24,17 +200,45 @@ class TagParser:
                 if len(buf) > 0:
                     self._outbound_handler.doData(self._current_tag, buf)
                 self._databuffer = None
+                if self._textlen > self._longest_text: self._longest_text = self._textlen
+                self._textlen = 0
 
         def startElement(self, name, attrs):
             #self._trace("startElement:%s" % name)
             self.flushdata()
+            # check all the limits first, so nothing over budget reaches the handler
+            self._elements += 1
+            if self._depth + 1 > self._deepest:
+                self._deepest = self._depth + 1
+                if self._deepest > self._max_depth:
+                    self._exceeded("max_depth", self._deepest, self._max_depth)
+            if self._elements % self.CLOCK_ELEMENTS == 0 and time.monotonic() > self._deadline:
+                self._exceeded("max_seconds", time.monotonic() - self._started_at, self._max_seconds)
+            if len(attrs) != 0:
+                self._attributes += len(attrs)
+                if len(attrs) > self._max_attributes:
+                    self._exceeded("max_attributes", len(attrs), self._max_attributes)
+                if self._scan_attributes:
+                    # attribute values are text too, and can hide entity expansion
+                    for value in attrs.values():
+                        if len(value) > self._max_text:
+                            self._exceeded("max_text", len(value), self._max_text)
+                        self._text += len(value)
+                    if self._text > self._input * self._max_expansion + self.EXPANSION_SLACK:
+                        self._exceeded("max_expansion", self._text / max(self._input, 1), self._max_expansion)
+
             self._current_tag = name
             if self._depth == 0:
                 self._outbound_handler.doStartDocument()
             self._outbound_handler.doStart(name)
             self._depth += 1
-            for attrname in attrs.getNames():
-                self._outbound_handler.doAttribute(name, attrname, attrs[attrname])
+            if len(attrs) == 0: return # nothing to deliver
+            if self._bulk_attributes:
+                # pass the tokenizer's own mapping, the handler picks out what it wants
+                self._outbound_handler.doAttributes(name, attrs)
+            else:
+                for attrname in attrs.getNames():
+                    self._outbound_handler.doAttribute(name, attrname, attrs[attrname])
 
         def characters(self, text):
             #self._trace("chars:%s" % text)
@@ -42,6 +246,12 @@ class TagParser:
                 self._databuffer = text
             else:
                 self._databuffer += text
+            self._textlen += len(text)
+            self._text += len(text)
+            if self._textlen > self._max_text:
+                self._exceeded("max_text", self._textlen, self._max_text)
+            if self._text > self._input * self._max_expansion + self.EXPANSION_SLACK:
+                self._exceeded("max_expansion", self._text / max(self._input, 1), self._max_expansion)
 
         def endElement(self, name):
             #self._trace("endElement:%s" % name)
@@ -51,23 +261,32 @@ class TagParser:
             self._depth -= 1
             if self._depth == 0:
                 self._outbound_handler.doEndDocument()
+                self._ended = True
+                if self._stop_at_end: raise TagParser.RootClosed()
 
     class InboundErrorHandler:
+        def __init__(self, sink):
+            self._sink = sink
+
         def warning(self, e):
+            self._sink.flush()  # so this comes after anything already emitted
             print("warning:", str(e))
             # really just informational, keep going
 
         def error(self, e):
+            self._sink.flush()
             print("error:", str(e))
             # possibly recoverable, keep going
 
         def fatalError(self, e):
+            self._sink.flush()
             print("fatal:", str(e))
             # never recoverable, give in
             raise e
 
     class DummyOutboundHandler:
-        def __init__(self, trace=print):
+        def __init__(self, trace=None):
+            if trace is None: trace = output.print
             self._trace = trace
 
         def doStartDocument(self) -> None:
@@ -79,6 +298,10 @@ class TagParser:
         def doAttribute(self, tag: str, name: str, value) -> None:
             self._trace("attr:(%s) %s=%s" % (tag, name, str(value)))
 
+        def doAttributes(self, tag: str, attrs) -> None:
+            for name, value in attrs.items():
+                self.doAttribute(tag, name, value)
+
         def doData(self, tag: str, data) -> None:
             self._trace("data:(%s) %s" % (tag, str(data)))
 
@@ -90,47 +313,179 @@ class TagParser:
 
     #NOTE: naive approach is: xml.sax.parse(filename, self._content_handler)
 
-    def __init__(self, *, trace=print, outbound_handler=None):
+    def __init__(self, *, trace=None, outbound_handler=None, sink=None, limits=None):
+        self._limits = limits  # Limits for each document, None for no limits
+        if sink is None: sink = output
+        self._sink = sink
+        if trace is None: trace = sink.print
         self._trace = trace
         if outbound_handler is None: outbound_handler = TagParser.DummyOutboundHandler(trace)
         self._outbound_handler = outbound_handler
         self._content_handler = None  # will lazy-start later
         self._xml_parser = None  # will lazy-start later
+        self._started = False
 
     def start(self) -> None:
         """Start an incremental parse process for future feed() calls"""
-        assert self._xml_parser is None
-        # will content_handler will fail in __init__
-        # if subclasses __init__ do other dependent work
-        self._content_handler = TagParser.InboundContentHandler(self._outbound_handler)
-        self._xml_parser = xml.sax.make_parser()
-        self._xml_parser.setContentHandler(self._content_handler)
-        self._xml_parser.setErrorHandler(TagParser.InboundErrorHandler())
+        assert not self._started, "start: parse already in progress, finish() or reset() it"
+        if self._xml_parser is None:
+            # will content_handler will fail in __init__
+            # if subclasses __init__ do other dependent work
+            self._content_handler = TagParser.InboundContentHandler(self._outbound_handler, self._limits)
+            self._xml_parser = xml.sax.make_parser()
+            self._xml_parser.setContentHandler(self._content_handler)
+            self._xml_parser.setErrorHandler(TagParser.InboundErrorHandler(self._sink))
+        # reuse the reader from last time, make_parser() is expensive, and it
+        # builds a fresh expat parser on the first feed() of each document.
+        # Always reset() so subclass state is fresh for every document
+        self.reset()
+        self._started = True
+
+    def reset(self) -> None:
+        """Abandon any parse in progress, ready to start() a new document"""
+        # subclasses extend this to reset their own per-document state,
+        # it is called by every start()
+        if self._xml_parser is not None:
+            self._content_handler.reset()
+            # only a parse abandoned part way through needs a new expat parser now
+            if self._started: self._xml_parser.reset()
+        self._started = False
 
     def feed(self, data) -> None:
         """Feed a single data item to a previously start()ed parser"""
         if data is not None:
             if not isinstance(data, str): data = str(data)
-            assert self._xml_parser is not None
+            assert self._started
+            self._content_handler.count_input(len(data))
             self._xml_parser.feed(data)
 
+    def get_counters(self) -> dict:
+        """Counters for the current (or last) document, e.g. elements, depth, input"""
+        if self._content_handler is None: return {}
+        return self._content_handler.get_counters()
+
+    def get_sink(self) -> OutputSink:
+        """The OutputSink this parser emits to"""
+        return self._sink
+
     def parse_from(self, iterable) -> None:
         """Parse a whole data set from an iterable"""
         self.start()
-        for item in iterable:
-            self.feed(item)
-        self.finish()
+        try:
+            for item in iterable:
+                self.feed(item)
+            self.finish()
+        except Exception:
+            # send on what was emitted before it went wrong,
+            # and leave this parser ready for the next document
+            try:
+                self._sink.flush()
+            finally:
+                self.reset()
+            raise
 
     def parse_file(self, filename:str) -> None:
         """Parse a whole data set from a single local filename"""
         with open(filename) as f:
             self.parse_from(f.readlines())
 
+    def parse_documents(self, documents) -> None:
+        """Parse each document in turn, each is a str or an iterable of data items"""
+        for document in documents:
+            if isinstance(document, str): document = (document,)
+            self.parse_from(document)
+
+    def parse_stream(self, iterable) -> None:
+        """Parse a stream of concatenated documents, e.g. lines of a log file"""
+        # A new document starts straight after the root element of the last one
+        # closes, even part way through an item, and whitespace between documents
+        # is skipped. Line breaks must be "\n" or "\r\n" to split mid-item,
+        # a lone "\r" would put the split in the wrong place.
+        in_document = False
+        line, column = 1, 0  # where the current item starts, in its document
+        try:
+            for item in iterable:
+                if item is None: continue
+                if not isinstance(item, str): item = str(item)
+                while True:
+                    if not in_document:
+                        item = item.lstrip()
+                        if item == "": break
+                        self.start()
+                        self._content_handler.set_stop_at_end(True)
+                        in_document = True
+                        line, column = 1, 0
+                    try:
+                        self.feed(item)
+                    except TagParser.RootClosed:
+                        # this document is complete, the rest of the item starts the next
+                        item = item[self._split_offset(item, line, column):]
+                        self._xml_parser.reset()  # expat stopped at the split, can't be closed
+                        self._started = False
+                        self.end_document()
+                        self._sink.flush()
+                        in_document = False
+                        continue
+                    lines = item.count("\n")
+                    if lines == 0:
+                        column += len(item)
+                    else:
+                        line += lines
+                        column = len(item) - item.rfind("\n") - 1
+                    break
+            if in_document:
+                self.finish()  # will report a truncated last document
+        except Exception:
+            # send on what was emitted before it went wrong,
+            # and leave this parser ready for the next document
+            try:
+                self._sink.flush()
+            finally:
+                self.reset()
+            raise
+        finally:
+            if self._content_handler is not None:
+                self._content_handler.set_stop_at_end(False)
+
+    def _split_offset(self, item:str, line:int, column:int) -> int:
+        # where the reader stopped, just after the root end tag, as an index into
+        # item, which started at line,column (1 based, 0 based) of the document
+        stop_line = self._xml_parser.getLineNumber()
+        stop_column = self._xml_parser.getColumnNumber()
+        if stop_line == line: return stop_column - column
+        index = -1
+        for _ in range(stop_line - line):
+            index = item.index("\n", index+1)
+        return index + 1 + stop_column
+
+    def parse_frames(self, f) -> None:
+        """Parse length-delimited documents, each b"<length>\\n" then length bytes of utf-8"""
+        while True:
+            header = f.readline()
+            if len(header) == 0: break # end of stream
+            if header.strip() == b"": continue
+            length = int(header)
+            payload = f.read(length)
+            if len(payload) != length:
+                raise ValueError("parse_frames: truncated frame, want:%d got:%d" % (length, len(payload)))
+            self.parse_from((payload.decode("utf-8"),))
+
     def finish(self) -> None:
         """Finish an incremental parse process done with start(), feed()..."""
-        assert self._xml_parser is not None
-        self._xml_parser.feed("", isFinal=True)
-        self._xml_parser = None
+        assert self._started
+        # close() does the final feed, and leaves the reader to build a fresh
+        # expat parser for the next document. feed("") first so that there is
+        # a parse to close (and report as empty) even if nothing was fed
+        self._xml_parser.feed("")
+        self._xml_parser.close()
+        self._started = False
+        self.end_document()
+        self._sink.flush()
+
+    def end_document(self) -> None:
+        """Called by finish() once a document has parsed, before the sink is flushed"""
+        # subclasses extend this to emit anything that waits for the whole document
+        pass
 
     @staticmethod
     def do_parse_file(filename:str) -> None:
@@ -146,9 +501,16 @@ class TagParser:
 class PathParser(TagParser):
     """Parse a file into a set of path=value calls (providing a path instead of tagname)"""
     class InboundHandler:
-        def __init__(self, outbound_handler):
+        def __init__(self, outbound_handler, attribute_filter=None):
             assert outbound_handler is not None #TODO<<<< what would the default be here? printing? i.e. PathClassifier?
             self._outbound_handler = outbound_handler
+            # attribute_filter(path) -> set of attribute names wanted on that path,
+            # or None for all of them. No attribute_filter delivers everything
+            self._attribute_filter = attribute_filter
+            self._bulk_attributes = hasattr(outbound_handler, "doAttributes")
+            self.reset()
+
+        def reset(self) -> None:
             self._pathstack = []
             self._path = "" # cached str version
 
@@ -176,6 +538,20 @@ class PathParser(TagParser):
             _ = tag  # argused (already part of self._path)
             self._outbound_handler.doAttribute(self._path, name, value)
 
+        def doAttributes(self, tag:str, attrs) -> None:
+            _ = tag  # argused (already part of self._path)
+            names = None if self._attribute_filter is None else self._attribute_filter(self._path)
+            if names is not None: # None means every attribute is wanted
+                if len(names) == 0: return # nothing wanted on this path
+                # only copy out the values that are wanted, in document order
+                attrs = {name: value for name, value in attrs.items() if name in names}
+                if len(attrs) == 0: return
+            if self._bulk_attributes:
+                self._outbound_handler.doAttributes(self._path, attrs)
+            else:
+                for name, value in attrs.items():
+                    self._outbound_handler.doAttribute(self._path, name, value)
+
         def doData(self, tag:str, data) -> None:
             _ = tag  # argused (already part of self._path)
             self._outbound_handler.doData(self._path, data)
@@ -187,11 +563,20 @@ class PathParser(TagParser):
         def doEndDocument(self) -> None:
             self._outbound_handler.doEndDocument()
 
-    def __init__(self, outbound_handler, **kwargs):
+    def __init__(self, outbound_handler, attribute_filter=None, **kwargs):
         # inject path processing into the handler for the app
         # this converts tag strings to path strings
         #TODO<<<< if outbound_handler is None, provide some DummyHandler, for basically making PathClassifier here
-        TagParser.__init__(self, outbound_handler=PathParser.InboundHandler(outbound_handler), **kwargs)
+        TagParser.__init__(self, outbound_handler=PathParser.InboundHandler(outbound_handler, attribute_filter), **kwargs)
+        self._attribute_filter = attribute_filter
+
+    def get_attribute_filter(self) -> callable or None:
+        """The attribute_filter(path) this parser was built with, None if it wants every attribute"""
+        return self._attribute_filter
+
+    def reset(self) -> None:
+        TagParser.reset(self)
+        self._outbound_handler.reset()  # path stack
 
     #TODO<<<< must pass outbound_handler at the moment
     # @staticmethod
@@ -225,6 +610,11 @@ class VariableParser(PathParser):
         def doAttribute(self, path:str, name:str, value) -> None:
             self.doVariable(path + "/%s" % name, value)
 
+        def doAttributes(self, path:str, attrs) -> None:
+            prefix = path + "/"
+            for name, value in attrs.items():
+                self.doVariable(prefix + name, value)
+
         def doEnd(self, path:str) -> None:
             if path is None or path == "": path = ""
             self.doVariable("%s~" % path)
@@ -237,17 +627,37 @@ class VariableParser(PathParser):
             self.doVariable("/~")
 
     class DummyOutboundHandler:
+        def __init__(self, emit=None):
+            if emit is None: emit = output.print
+            self._emit = emit
+
         def doVariable(self, name: str, value=None) -> None:
             if value is None or value == "":
-                print(name)
+                self._emit(name)
             else:
-                print("%s=%s" % (name, str(value)))
+                self._emit("%s=%s" % (name, str(value)))
 
-    def __init__(self, outbound_handler=None, **kwargs):
+    def __init__(self, outbound_handler=None, sink=None, **kwargs):
         # inject path processing into the handler for the app
         # this converts tag strings to path strings
-        if outbound_handler is None: outbound_handler = VariableParser.DummyOutboundHandler()
-        PathParser.__init__(self, outbound_handler=VariableParser.InboundHandler(outbound_handler), **kwargs)
+        # pass attribute_filter=callable(path)->names to only deliver those attributes
+        if sink is None: sink = output
+        if outbound_handler is None: outbound_handler = VariableParser.DummyOutboundHandler(sink.print)
+        PathParser.__init__(self, outbound_handler=VariableParser.InboundHandler(outbound_handler), sink=sink, **kwargs)
+        self._stopped = False
+
+    def reset(self) -> None:
+        PathParser.reset(self)
+        self._stopped = False
+
+    def stop(self, rules=None, value=None) -> None:
+        """Mark this parser as finished, so a MultiParser can detach it early"""
+        # can be used directly as a rule action, e.g. "/rss/channel~": (ptag.VariableParser.stop,)
+        _,_ = rules, value  # argsused
+        self._stopped = True
+
+    def is_stopped(self) -> bool:
+        return self._stopped
 
     @staticmethod
     def do_parse_file(filename:str) -> None:
@@ -263,11 +673,16 @@ class VariableParser(PathParser):
 #-------------------------------------------------------------------------------
 class PathClassifier(VariableParser):
     """Emit a list of paths in this file"""
-    def __init__(self, emit=print, **kwargs):
+    def __init__(self, emit=None, **kwargs):
         VariableParser.__init__(self, outbound_handler=self, **kwargs)
+        if emit is None: emit = self._sink.print
         self._emit = emit
         self._paths = {} # path:str -> count(values)
 
+    def reset(self) -> None:
+        VariableParser.reset(self)
+        self._paths = {}
+
     def doVariable(self, name:str, value=None) -> None:
         _ = value  # argused
         # only print first occurence
@@ -293,10 +708,17 @@ class PathClassifier(VariableParser):
 #----- HTML HREF PARSER ------------------------------------------------------
 class HTMLHREFExtractor(VariableParser):
     """Extract all A HREF links from a HTML page"""
-    def __init__(self, extract=print, **kwargs):
-        VariableParser.__init__(self, outbound_handler=self, **kwargs)
+    HREF = frozenset(("href",))
+
+    def __init__(self, extract=None, **kwargs):
+        VariableParser.__init__(self, outbound_handler=self, attribute_filter=self._wanted_attributes, **kwargs)
+        if extract is None: extract = self._sink.print
         self._extract = extract
 
+    def _wanted_attributes(self, path:str) -> frozenset:
+        # only href on tags ending in 'a' can ever match in doVariable()
+        return self.HREF if path.endswith("a") else frozenset()
+
     def doVariable(self, name: str, value=None) -> None:
         if name.endswith("a/href"): self._extract(value)
 
@@ -319,12 +741,32 @@ class RuleParser(VariableParser):
     RULES = None # override in subclass
 
     def __init__(self, **kwargs):
-        VariableParser.__init__(self, outbound_handler=self, **kwargs)
+        VariableParser.__init__(self, outbound_handler=self, attribute_filter=self._wanted_attributes, **kwargs)
         self._rules = self.RULES
+        self._attributes = self._compile_attributes(self._rules)
+
+    @staticmethod
+    def _compile_attributes(rules) -> dict or None:
+        """Work out which attribute names each element path could need, from the rules"""
+        # any rule "/a/b/name" might be attribute 'name' of element "/a/b",
+        # so this is a (small) superset of the attributes actually used.
+        if rules is None: return None # no rules, so deliver everything
+        attributes = {}
+        for name in rules:
+            if name.endswith("/") or name.endswith("~"): continue # data or end rule
+            path, _, attrname = name.rpartition("/")
+            if path == "" or attrname == "": continue # "/" or top level element
+            attributes.setdefault(path, set()).add(attrname)
+        return {path: frozenset(names) for path, names in attributes.items()}
+
+    def _wanted_attributes(self, path:str) -> frozenset or None:
+        if self._attributes is None: return None # no rules, deliver everything
+        return self._attributes.get(path, frozenset())
 
     def doVariable(self, name: str, value=None) -> None:
+        if self._stopped: return # already finished with this document
         if self._rules is None:
-            print("no rules:", name, value)
+            self._sink.print("no rules:", name, value)
             return
         rule = self._get_rule_for(name)
         if rule is None:
@@ -340,6 +782,14 @@ class RuleParser(VariableParser):
         # default action, if not handled above
         ##print(str(rule), str(value) if value is not None else "")
 
+    def emit(self, rules, value) -> None:
+        """Rule action (emit, label...), prints the labels then the value to the sink"""
+        self._sink.print(*(rules[1:] + (value,)))
+
+    def emit_format(self, rules, value) -> None:
+        """Rule action (emit_format, "fmt%s"), prints the formatted value to the sink"""
+        self._sink.print(rules[1] % value)
+
     def _get_rule_for(self, name:str) -> callable or None:
         try:
             return self._rules[name]
@@ -358,6 +808,10 @@ class RecBuilder(RuleParser):
     def quoted(s:str) -> str:
         return "\"%s\"" % s
 
+    def reset(self) -> None:
+        RuleParser.reset(self)
+        self._rec = {}
+
     def start_rec(self, rules, value) -> None:
         self._rec = {}
 
@@ -367,17 +821,110 @@ class RecBuilder(RuleParser):
 
     def end_rec(self, rules, value) -> None:
         _,_ = rules, value  # argsused
-        for i in range(len(self.HEADINGS)):
-            key = self.HEADINGS[i]
-            try:
-                value = self._rec[key]
-            except KeyError:
-                value = "(none)"
-            if self.QUOTED[i]:
-                print(self.quoted(value), end=" ")
-            else:
-                print(value, end=" ")
-        print()
+        self.emit_rec(self._rec)
+
+    def emit_rec(self, rec:dict) -> None:
+        """Output a completed record, override to send it somewhere else"""
+        if self._sink.jsonl:
+            self._sink.write_json(self.get_values(rec))
+            return
+        line = []
+        for key, quoted in zip(self.HEADINGS, self.QUOTED):
+            value = rec.get(key, "(none)")
+            line.append(self.quoted(value) if quoted else str(value))
+            line.append(" ")
+        line.append("\n")
+        self._sink.write("".join(line))
+
+    def get_values(self, rec:dict) -> dict:
+        """Just the HEADINGS fields of a record, in HEADINGS order"""
+        return {key: rec.get(key, "(none)") for key in self.HEADINGS}
+
+    # No class methods, because it makes no sense to handle with no RULES
+    # provide RULES in subclass and use class helper methods in that if necc.
+
+#-------------------------------------------------------------------------------
+class RecDiffer(RecBuilder):
+    """Only emit records that were inserted, changed or deleted since the last parse"""
+    # Each document parsed is one snapshot. Records are remembered by their
+    # KEY field as a short hash of their HEADINGS values, and that cache can
+    # be kept in a local file between runs.
+    KEY = None # provide in subclass, e.g. "code"
+
+    INSERT = "insert"
+    CHANGE = "change"
+    DELETE = "delete"
+
+    def __init__(self, cache_filename:str or None=None, **kwargs):
+        RecBuilder.__init__(self, **kwargs)
+        assert self.KEY is not None, "RecDiffer: KEY not set in subclass"
+        self._cache_filename = cache_filename
+        self._hashes = {}  # key:str -> hash:str, as of the last snapshot
+        self._seen = {}    # key:str -> hash:str, in this snapshot
+        self._counts = {self.INSERT: 0, self.CHANGE: 0, self.DELETE: 0}
+        if cache_filename is not None and os.path.exists(cache_filename):
+            self.load(cache_filename)
+
+    def load(self, filename:str) -> None:
+        with open(filename) as f:
+            self._hashes = json.load(f)
+
+    def save(self, filename:str) -> None:
+        # write then rename, so a crash never leaves a half written cache
+        tmpname = filename + ".tmp"
+        with open(tmpname, "w") as f:
+            json.dump(self._hashes, f, separators=(",", ":"))
+        os.replace(tmpname, filename)
+
+    def _hash(self, rec:dict) -> str:
+        values = [str(value) for value in self.get_values(rec).values()]
+        return hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=8).hexdigest()
+
+    def reset(self) -> None:
+        RecBuilder.reset(self)
+        self._seen = {}
+        self._counts = {self.INSERT: 0, self.CHANGE: 0, self.DELETE: 0}
+
+    def emit_rec(self, rec:dict) -> None:
+        try:
+            key = str(rec[self.KEY])
+        except KeyError:
+            # can't track it without a key, so always pass it on
+            self.emit_change(self.INSERT, None, rec)
+            return
+        rec_hash = self._hash(rec)
+        self._seen[key] = rec_hash
+        old_hash = self._hashes.get(key)
+        if old_hash is None:
+            self.emit_change(self.INSERT, key, rec)
+        elif old_hash != rec_hash:
+            self.emit_change(self.CHANGE, key, rec)
+
+    def end_document(self) -> None:
+        RecBuilder.end_document(self)
+        # anything not seen in this snapshot has gone away
+        for key in self._hashes:
+            if key not in self._seen:
+                self.emit_change(self.DELETE, key, None)
+        self._hashes = self._seen
+        self._seen = {}
+        if self._cache_filename is not None:
+            self.save(self._cache_filename)
+
+    def emit_change(self, change:str, key:str or None, rec:dict or None) -> None:
+        """Output one change, override to send it somewhere else"""
+        self._counts[change] += 1
+        if self._sink.jsonl:
+            self._sink.write_json({"change": change, "key": key, "rec": None if rec is None else self.get_values(rec)})
+        elif rec is None:
+            self._sink.write("%s %s\n" % (change, key))
+        else:
+            self._sink.write(change + " ")
+            RecBuilder.emit_rec(self, rec)
+
+    def get_counts(self) -> dict:
+        """Number of each type of change in the last snapshot"""
+        return self._counts
 
     # No class methods, because it makes no sense to handle with no RULES
     # provide RULES in subclass and use class helper methods in that if necc.
@@ -391,6 +938,11 @@ class SQLGenerator(RuleParser):
         self._inserts = []
         self.start_rec()
 
+    def reset(self) -> None:
+        RuleParser.reset(self)
+        self._inserts = []
+        self.start_rec()
+
     def _emptyTable(self, tableName: str) -> None:
         self._rec[tableName] = {}
 
@@ -454,8 +1006,79 @@ class SQLGenerator(RuleParser):
     # No class methods, because it makes no sense to handle with no RULES
     # provide RULES in subclass and use class helper methods in that if necc.
 
+#-------------------------------------------------------------------------------
+class MultiParser(VariableParser):
+    """Parse a file once, and fan out the variables to several consumer parsers"""
+    # Each consumer must be a VariableParser that handles its own doVariable()
+    # calls (PathClassifier, HTMLHREFExtractor, any RuleParser...), and keeps
+    # its own RULES and state. Consumers that stop() are detached for the rest
+    # of the parse.
+
+    def __init__(self, *consumers, **kwargs):
+        for consumer in consumers:
+            assert isinstance(consumer, VariableParser) and hasattr(consumer, "doVariable"), \
+                "MultiParser: consumer must be a VariableParser with doVariable(), got:%s" % type(consumer).__name__
+        VariableParser.__init__(self, outbound_handler=self, attribute_filter=self._wanted_attributes, **kwargs)
+        self._consumers = consumers
+        self._attached = list(consumers)
+        self._attributes = {} # path:str -> frozenset(names) or None, for attached consumers
+
+    def reset(self) -> None:
+        VariableParser.reset(self)
+        # every consumer takes part in each new parse
+        for consumer in self._consumers:
+            consumer.reset()
+        self._attached = list(self._consumers)
+        self._attributes = {}
+
+    def end_document(self) -> None:
+        VariableParser.end_document(self)
+        # every consumer saw this document, even those that stopped early,
+        # and some may emit to a sink of their own
+        for consumer in self._consumers:
+            consumer.end_document()
+            consumer.get_sink().flush()
+
+    def detach(self, consumer) -> None:
+        """Stop sending variables to this consumer, for the rest of this parse"""
+        if consumer in self._attached:
+            self._attached.remove(consumer)
+            self._attributes = {}  # what is wanted may have shrunk
+
+    def _wanted_attributes(self, path:str) -> frozenset or None:
+        try:
+            return self._attributes[path]
+        except KeyError:
+            pass
+        # union of what every attached consumer wants, None if any want them all
+        names = frozenset()
+        for consumer in self._attached:
+            attribute_filter = consumer.get_attribute_filter()
+            wanted = None if attribute_filter is None else attribute_filter(path)
+            if wanted is None:
+                names = None
+                break
+            names = names.union(wanted)
+        self._attributes[path] = names
+        return names
+
+    def doVariable(self, name:str, value=None) -> None:
+        stopped = None
+        for consumer in self._attached:
+            consumer.doVariable(name, value)
+            if consumer.is_stopped():
+                if stopped is None: stopped = []
+                stopped.append(consumer)
+        if stopped is not None:
+            for consumer in stopped:
+                self.detach(consumer)
+
+    def get_consumers(self) -> tuple:
+        return self._consumers
+
+    # No class methods, because it makes no sense to handle with no consumers
+
 #----- SIMPLE TEST HARNESS -----------------------------------------------------
-import sys
 
 def main(self, argv):
     DEFAULT_FILENAME = "test.html"
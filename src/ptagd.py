@@ -0,0 +1,361 @@
+#! /usr/bin/env python3
+# ptagd.py  19/10/2026
+#   a long running parse server, that keeps parsers warm between documents
+
+import sys
+import os
+import io
+import json
+import stat
+import socket
+import signal
+import inspect
+import importlib
+
+import ptag
+
+#----- FRAMING -----------------------------------------------------------------
+# Every message is a header line "<kind> [<arg>...] <length>\n" then length bytes.
+#
+# requests:  parse <Parser> <length>\n<document>
+#            file <Parser> <length>\n<path>
+#            quit 0\n
+# responses: data <length>\n<output>          zero or more, as the parser emits
+#            ok <length>\n<counters as json>  document done
+#            error <length>\n<message>        document failed
+
+def write_frame(f, kind:str, payload:bytes=b"", *args) -> None:
+    header = " ".join((kind,) + args + (str(len(payload)),))
+    f.write(header.encode("ascii") + b"\n")
+    f.write(payload)
+
+def read_frame(f) -> tuple or None:
+    """Read one frame as (kind, args, payload), or None at end of stream"""
+    header = f.readline()
+    if len(header) == 0: return None # end of stream
+    fields = header.decode("ascii").split()
+    if len(fields) < 2:
+        raise ValueError("read_frame: bad header:%s" % repr(header))
+    length = int(fields[-1])
+    payload = f.read(length)
+    if len(payload) != length:
+        raise ValueError("read_frame: truncated frame, want:%d got:%d" % (length, len(payload)))
+    return fields[0], fields[1:-1], payload
+
+class FrameWriter(io.RawIOBase):
+    """A binary stream that wraps everything written to it in data frames"""
+    # so that the usual OutputSink can stream records back to a client
+    def __init__(self, f):
+        io.RawIOBase.__init__(self)
+        self._f = f
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        write_frame(self._f, "data", bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        self._f.flush()
+
+#----- SERVER ------------------------------------------------------------------
+class ParseServer:
+    """Keep named parsers loaded and warm, and parse documents sent to them"""
+    def __init__(self, modules=(), limits=None):
+        self._limits = limits
+        self._sink = ptag.OutputSink()  # for every parser here, sent to each client in turn
+        self._classes = {}     # name:str -> parser class
+        self._parsers = {}     # name:str -> parser, reused (and reset) for every document
+        self._unservable = {}  # name:str -> why it can't be served
+        for module in (ptag,) + tuple(modules):
+            for name in dir(module):
+                value = getattr(module, name)
+                if isinstance(value, type) and issubclass(value, ptag.TagParser):
+                    if issubclass(value, ptag.RecDiffer) and value.KEY is None:
+                        self._unservable[name] = "no KEY, only its subclasses can be used"
+                        continue
+                    try:
+                        # needs arguments we can't give it (e.g. PathParser)
+                        inspect.signature(value).bind(limits=None, sink=None)
+                    except TypeError as e:
+                        self._unservable[name] = str(e)
+                        continue
+                    self._classes[name] = value
+
+    def refuse_stateful(self, why:str) -> None:
+        """Stop serving parsers that carry state from one document to the next"""
+        # e.g. each forked worker would keep its own RecDiffer snapshot, and a
+        # client would see changes against whichever worker it happened to get
+        for name, parser_class in list(self._classes.items()):
+            if issubclass(parser_class, ptag.RecDiffer):
+                del self._classes[name]
+                self._parsers.pop(name, None)
+                self._unservable[name] = why
+
+    def get_parser(self, name:str):
+        try:
+            return self._parsers[name]
+        except KeyError:
+            pass
+        try:
+            parser_class = self._classes[name]
+        except KeyError:
+            if name in self._unservable:
+                raise LookupError("parser can't be served:%s (%s)" % (name, self._unservable[name]))
+            raise LookupError("unknown parser:%s" % name)
+        parser = parser_class(limits=self._limits, sink=self._sink)
+        self._parsers[name] = parser
+        return parser
+
+    def warm(self) -> None:
+        """Build every parser and its xml reader up front, so the first document is fast"""
+        for name in self._classes:
+            try:
+                parser = self.get_parser(name)
+                parser.start()
+                parser.reset()
+            except Exception as e:
+                # a broken parser, report it now rather than on every request
+                sys.stderr.write("ptagd: can't warm %s: %s: %s\n" % (name, type(e).__name__, str(e)))
+
+    def _send_collected(self, parser) -> None:
+        # parsers that collect results rather than emit them, send them back now
+        if isinstance(parser, ptag.SQLGenerator):
+            self._sink.print(parser.get_sql())
+
+    def handle(self, rfile, wfile) -> None:
+        """Serve requests from one client, until it quits or goes away"""
+        self._sink.redirect(FrameWriter(wfile))
+        try:
+            while True:
+                request = read_frame(rfile)
+                if request is None: break
+                command, args, payload = request
+                if command == "quit": break
+                try:
+                    if len(args) != 1:
+                        raise ValueError("bad request:%s %s" % (command, " ".join(args)))
+                    parser = self.get_parser(args[0])
+                    if command == "parse":
+                        parser.parse_from((payload.decode("utf-8"),))
+                    elif command == "file":
+                        parser.parse_file(payload.decode("utf-8"))
+                    else:
+                        raise ValueError("unknown command:%s" % command)
+                    self._send_collected(parser)
+                    self._sink.flush()
+                    write_frame(wfile, "ok", json.dumps(parser.get_counters()).encode("utf-8"))
+                except Exception as e:
+                    self._sink.flush() # anything emitted before it went wrong
+                    write_frame(wfile, "error", str(e).encode("utf-8"))
+                wfile.flush()
+        finally:
+            # never leave the sink pointing at a client that has gone
+            self._sink.redirect(None)
+
+    def serve_stdio(self) -> None:
+        """Serve one client over stdin/stdout"""
+        out = sys.stdout.buffer
+        sys.stdout = sys.stderr  # stray print()s must not corrupt the framing
+        self.warm()
+        self.handle(sys.stdin.buffer, out)
+
+    def serve_unix(self, path:str, workers:int=1) -> None:
+        """Serve any number of clients on a unix socket, with a pool of forked workers"""
+        if workers > 1: self.refuse_stateful("keeps state between documents, so can't be shared by %d workers" % workers)
+        self._remove_socket(path)  # left behind by a server that didn't tidy up
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(64)
+        # warm up before forking, so every worker starts with the parsers built
+        self.warm()
+        children = []
+        signal.signal(signal.SIGTERM, ParseServer._terminate)
+        for _ in range(workers-1):
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                try:
+                    self._accept_loop(listener)
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        try:
+            self._accept_loop(listener)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            listener.close()
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass # already gone, e.g. after a ctrl-C
+                os.waitpid(pid, 0)
+            self._remove_socket(path)
+
+    @staticmethod
+    def _remove_socket(path:str) -> None:
+        # only ever remove a socket, never a file that happens to be in the way
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError("ptagd: not a socket, won't remove:%s" % path)
+        os.remove(path)
+
+    @staticmethod
+    def _terminate(signum, frame) -> None:
+        _,_ = signum, frame  # argsused
+        raise SystemExit(0)  # so serve_unix() tidies up on a plain kill
+
+    def _accept_loop(self, listener) -> None:
+        while True:
+            conn, _ = listener.accept()
+            with conn:
+                rfile = conn.makefile("rb")
+                wfile = conn.makefile("wb")
+                try:
+                    self.handle(rfile, wfile)
+                except (ConnectionError, ValueError) as e:
+                    sys.stderr.write("ptagd: dropped client:%s\n" % str(e))
+                finally:
+                    rfile.close()
+                    try:
+                        wfile.close()
+                    except ConnectionError:
+                        pass # client has already gone
+
+#----- CLIENT ------------------------------------------------------------------
+class ServerError(Exception):
+    """The server could not parse a document"""
+    pass
+
+class ParseClient:
+    """Send documents to a running ptagd on this machine"""
+    def __init__(self, path:str):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._rfile = self._socket.makefile("rb")
+        self._wfile = self._socket.makefile("wb")
+
+    def _request(self, command:str, parser_name:str, payload:bytes, emit) -> dict:
+        if emit is None: emit = sys.stdout.buffer.write
+        write_frame(self._wfile, command, payload, parser_name)
+        self._wfile.flush()
+        while True:
+            response = read_frame(self._rfile)
+            if response is None: raise ServerError("server went away")
+            kind, _, payload = response
+            if kind == "data":
+                emit(payload)
+            elif kind == "ok":
+                return json.loads(payload)
+            else:
+                raise ServerError(payload.decode("utf-8"))
+
+    def parse(self, parser_name:str, document:str, emit=None) -> dict:
+        """Parse a document, emit(bytes) gets the output, returns the counters"""
+        return self._request("parse", parser_name, document.encode("utf-8"), emit)
+
+    def parse_file(self, parser_name:str, filename:str, emit=None) -> dict:
+        """Parse a file on this machine, emit(bytes) gets the output, returns the counters"""
+        return self._request("file", parser_name, os.path.abspath(filename).encode("utf-8"), emit)
+
+    def close(self) -> None:
+        try:
+            write_frame(self._wfile, "quit")
+            self._wfile.flush()
+        finally:
+            self._rfile.close()
+            self._wfile.close()
+            self._socket.close()
+
+#----- COMMAND LINE ------------------------------------------------------------
+USAGE = """\
+usage:
+  ptagd.py [--unix PATH] [--workers N] [--max-depth N] [--max-text N]
+           [--max-attributes N] [--max-expansion X] [--max-input N]
+           [--max-seconds S] [module...]
+      serve parsers from ptag and the named modules (e.g. cars news),
+      on a unix socket, or on stdin/stdout if no --unix.
+      Parsers that keep state between documents (RecDiffer) need --workers 1
+  ptagd.py --connect PATH --Parser file...
+      send files to a running server, just like ptag.py --Parser file...
+"""
+
+LIMIT_OPTIONS = {
+    "--max-depth":      ("max_depth", int),
+    "--max-text":       ("max_text", int),
+    "--max-attributes": ("max_attributes", int),
+    "--max-expansion":  ("max_expansion", float),
+    "--max-input":      ("max_input", int),
+    "--max-seconds":    ("max_seconds", float),
+}
+
+def client_main(path:str, argv) -> None:
+    client = ParseClient(path)
+    parser_name = "PathClassifier"
+    try:
+        for arg in argv:
+            if arg.startswith("--"):
+                parser_name = arg[2:]
+            else:
+                try:
+                    client.parse_file(parser_name, arg)
+                except ServerError as e:
+                    sys.stdout.flush()
+                    sys.stderr.write("%s: %s\n" % (arg, str(e)))
+    finally:
+        sys.stdout.flush()
+        client.close()
+
+def main(argv) -> None:
+    path = None
+    workers = 1
+    limits = {}
+    modules = []
+    i = 0
+    try:
+        while i < len(argv):
+            arg = argv[i]
+            if arg == "--connect":
+                client_main(argv[i+1], argv[i+2:])
+                return
+            elif arg == "--unix":
+                path = argv[i+1]
+                i += 1
+            elif arg == "--workers":
+                workers = int(argv[i+1])
+                i += 1
+            elif arg in LIMIT_OPTIONS:
+                name, convert = LIMIT_OPTIONS[arg]
+                limits[name] = convert(argv[i+1])
+                i += 1
+            elif arg.startswith("-"):
+                raise ValueError("unknown option:%s" % arg)
+            else:
+                modules.append(importlib.import_module(arg))
+            i += 1
+    except (IndexError, ValueError, ImportError) as e:
+        sys.stderr.write("%s\n%s" % (str(e), USAGE))
+        exit(1)
+
+    server = ParseServer(modules, ptag.Limits(**limits) if len(limits) != 0 else None)
+    if path is None:
+        server.serve_stdio()
+    else:
+        try:
+            server.serve_unix(path, workers)
+        except FileExistsError as e:
+            sys.stderr.write("%s\n" % str(e))
+            exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+
+# END
@@ -7,15 +7,15 @@ import ptag
 #class SFIAParser(ptag.VariableParser):
 class SFIAParser(ptag.RuleParser):
     RULES = {
-        "/html/body/div/div/main/section/article/header/h1/":                    lambda v:print("title:", v),          # skill title[0]
-        "/html/body/div/div/main/section/article/header/h1/span/":               lambda v:print("code:", v),           # skill code[0]
-        ##"/html/body/div/div/main/section/article/header/div/span/span/":         lambda v:print("title_summary:", v),  # title[0] summary[1]
-        "/html/body/div/div/main/section/article/header/div/div/p/":             lambda v:print("summary:", v),        # summary[0]
-        "/html/body/div/div/main/section/article/div/div/div/div/div/p/":        lambda v:print("desc:", v),           # longdesc[0,1]
-        "/html/body/div/div/main/section/article/div/div/div/div/div/ul/li/":    lambda v:print("areas:", v),           # skill test[*]
-        "/html/body/div/div/main/section/article/div/div/div/table/tr/td/":      lambda v:print("levels:", v),         # applicable levels[*]
-        "/html/body/div/div/main/section/article/div/div/div/div/div/div/p/":    lambda v:print("compstmt:", v),       # competency statements[*]
-        "/html/body/div/div/main/aside/div/aside/div/span/a/":                   lambda v:print("related:", v),        # related areas[*]
+        "/html/body/div/div/main/section/article/header/h1/":                    (ptag.RuleParser.emit, "title:"),          # skill title[0]
+        "/html/body/div/div/main/section/article/header/h1/span/":               (ptag.RuleParser.emit, "code:"),           # skill code[0]
+        ##"/html/body/div/div/main/section/article/header/div/span/span/":         (ptag.RuleParser.emit, "title_summary:"),  # title[0] summary[1]
+        "/html/body/div/div/main/section/article/header/div/div/p/":             (ptag.RuleParser.emit, "summary:"),        # summary[0]
+        "/html/body/div/div/main/section/article/div/div/div/div/div/p/":        (ptag.RuleParser.emit, "desc:"),           # longdesc[0,1]
+        "/html/body/div/div/main/section/article/div/div/div/div/div/ul/li/":    (ptag.RuleParser.emit, "areas:"),           # skill test[*]
+        "/html/body/div/div/main/section/article/div/div/div/table/tr/td/":      (ptag.RuleParser.emit, "levels:"),         # applicable levels[*]
+        "/html/body/div/div/main/section/article/div/div/div/div/div/div/p/":    (ptag.RuleParser.emit, "compstmt:"),       # competency statements[*]
+        "/html/body/div/div/main/aside/div/aside/div/span/a/":                   (ptag.RuleParser.emit, "related:"),        # related areas[*]
     }
 
     @staticmethod